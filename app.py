@@ -1,17 +1,28 @@
 import os
 import io
+import html
 import json
 import logging
 import asyncio
+import threading
+import uuid
+import concurrent.futures
 
+import httpx
+import requests
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, filters, ContextTypes
 from telegram.constants import ParseMode
 from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
 
 from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from google.auth.transport.requests import AuthorizedSession, Request
+
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
 
 # --- Configuration Section ---
 TOKEN = os.environ.get("TELEGRAM_TOKEN")
@@ -20,47 +31,432 @@ SERVICE_ACCOUNT_FILE = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "google_
 WEBHOOK_URL = os.environ.get("WEBHOOK_URL") 
 # Render provides the PORT environment variable
 PORT = int(os.environ.get("PORT", 8080))
+# Drive resumable chunks must be a multiple of 256 KB
+STREAM_CHUNK_SIZE = 1024 * 1024
+# How many downloaded chunks may wait for the uploader before the download pauses
+STREAM_QUEUE_SIZE = 4
+# Files below this size are sent in one multipart request instead of a resumable session
+SIMPLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+# Streamed files (SIMPLE_UPLOAD_LIMIT and up) above this size are fetched as several
+# parallel Range requests; smaller streamed files use a single GET
+PARALLEL_DOWNLOAD_THRESHOLD = 2 * SIMPLE_UPLOAD_LIMIT
+PARALLEL_DOWNLOAD_PARTS = 4
+# Connections kept open to api.telegram.org
+TELEGRAM_POOL_SIZE = 32
+# Parallel webhook connections Telegram may open to us (Telegram's default is 40)
+TG_WEBHOOK_CONNS = int(os.environ.get("TG_WEBHOOK_CONNS", "100"))
+# Seconds to wait after the last photo of an album before uploading the album
+ALBUM_DEBOUNCE = 2
+# Number of Drive uploads allowed to run at the same time
+DRIVE_UPLOAD_WORKERS = int(os.environ.get("DRIVE_UPLOAD_WORKERS", "8"))
+# Access tokens live for 60 minutes; refresh them in the background before that
+CREDS_REFRESH_INTERVAL = 50 * 60
+CREDS_RETRY_INTERVAL = 60
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files"
+DRIVE_UPLOAD_FIELDS = "id, webViewLink"
 
 # Logging setup
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
+# httpx logs every request at INFO, including Telegram file URLs that contain the token
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# --- Google Drive Section (Unchanged) ---
+# --- Streaming Section ---
+
+# Shared by every download so connections to the Telegram file server stay alive.
+# Plain HTTP/1.1: the parallel Range requests should get their own TCP connections
+# rather than being multiplexed onto one HTTP/2 connection.
+DOWNLOAD_CLIENT = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=TELEGRAM_POOL_SIZE, max_keepalive_connections=TELEGRAM_POOL_SIZE)
+)
+
+class TelegramDownloadError(Exception):
+    """
+    A download from the Telegram file server failed.
+    Carries no URL: Telegram file URLs contain the bot token.
+    """
+
+def download_error(error):
+    """Turns an httpx error into a TelegramDownloadError without the request URL."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return TelegramDownloadError(f"Telegram file download failed with HTTP {error.response.status_code}")
+    return TelegramDownloadError(f"Telegram file download failed ({type(error).__name__})")
+
+def abort_queue(queue, error):
+    """
+    Replaces whatever is left in queue with error, so a QueueReader blocked on it
+    raises instead of waiting forever for a producer that is gone.
+    """
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(error)
+
+class QueueReader(io.RawIOBase):
+    """
+    Blocking file-like reader over an asyncio.Queue of byte chunks.
+    Meant to be read from an executor thread while the event loop fills the queue.
+    A chunk of None marks the end of the stream; an exception object is re-raised.
+    """
+
+    def __init__(self, queue, loop):
+        self._queue = queue
+        self._loop = loop
+        self._pending = memoryview(b"")
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._eof:
+            chunk = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+            if chunk is None:
+                self._eof = True
+            elif isinstance(chunk, BaseException):
+                raise chunk
+            else:
+                self._pending = memoryview(chunk)
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+async def download_file(url, size=0):
+    """
+    Downloads url completely into a bytearray preallocated to the size Telegram reported,
+    so the body is copied into place once instead of being collected and joined.
+    """
+    buffer = bytearray(size)
+    offset = 0
+    try:
+        async with DOWNLOAD_CLIENT.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                end = offset + len(chunk)
+                # In place while inside the preallocated size, grows only if it was under-reported
+                buffer[offset:end] = chunk
+                offset = end
+    except httpx.HTTPError as e:
+        # from None: the chained httpx error would put the tokenized URL into tracebacks
+        raise download_error(e) from None
+    del buffer[offset:]
+    return buffer
+
+class RangeNotSupported(Exception):
+    """The file server answered a Range request with the whole file."""
+
+async def download_whole(url, queue):
+    """Streams url into queue in STREAM_CHUNK_SIZE chunks."""
+    async with DOWNLOAD_CLIENT.stream("GET", url) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+            await queue.put(chunk)
+
+async def download_range(url, start, end, part_queue):
+    """Streams bytes start..end (inclusive) of url into part_queue, ending with None (or the raised exception)."""
+    try:
+        async with DOWNLOAD_CLIENT.stream("GET", url, headers={"Range": f"bytes={start}-{end}"}) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeNotSupported()
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                await part_queue.put(chunk)
+        await part_queue.put(None)
+    except Exception as e:
+        await part_queue.put(e)
+
+async def download_parts(url, queue, size):
+    """
+    Fetches url as parallel Range requests and queues their chunks in file order.
+    Later parts buffer their whole slice while earlier ones are uploaded, so every
+    connection runs at full speed and is released as soon as its part is in. Memory is
+    bounded by the file size, which Telegram caps at 20 MB.
+    Raises RangeNotSupported, before anything was queued, if the server ignores Range.
+    """
+    part_size = -(-size // PARALLEL_DOWNLOAD_PARTS)
+    part_queues = []
+    tasks = []
+    for start in range(0, size, part_size):
+        part_queue = asyncio.Queue()
+        part_queues.append(part_queue)
+        tasks.append(asyncio.create_task(
+            download_range(url, start, min(start + part_size, size) - 1, part_queue)
+        ))
+    try:
+        for index, part_queue in enumerate(part_queues):
+            while True:
+                chunk = await part_queue.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, RangeNotSupported) and index > 0:
+                    # Earlier parts are already queued, so falling back would duplicate them
+                    raise TelegramDownloadError("Telegram file server stopped honoring Range requests")
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                await queue.put(chunk)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def stream_download(url, queue, size=None):
+    """Downloads url chunk by chunk into queue, ending with None (or the raised exception)."""
+    try:
+        if size and size > PARALLEL_DOWNLOAD_THRESHOLD:
+            try:
+                await download_parts(url, queue, size)
+            except RangeNotSupported:
+                logger.warning("Telegram file server ignored Range, downloading in one request")
+                await download_whole(url, queue)
+        else:
+            await download_whole(url, queue)
+        await queue.put(None)
+    except httpx.HTTPError as e:
+        await queue.put(download_error(e))
+    except Exception as e:
+        await queue.put(e)
+
+# --- Google Drive Section ---
+
+# Drive uploads get their own pool so they never starve the default executor
+UPLOAD_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=DRIVE_UPLOAD_WORKERS, thread_name_prefix="drive-upload"
+)
+# Uploads past the pool size wait here instead of piling up (and hitting Drive rate limits)
+upload_slots = asyncio.Semaphore(DRIVE_UPLOAD_WORKERS)
+
+# Parsed once at startup so the RSA key is never read on the upload path
+CREDS = Credentials.from_service_account_file(
+    SERVICE_ACCOUNT_FILE, scopes=["https://www.googleapis.com/auth/drive"]
+)
+
+_drive_session = None
+_drive_lock = threading.Lock()
+
+def refresh_drive_credentials():
+    """Refreshes the Drive access token and schedules the next refresh."""
+    interval = CREDS_REFRESH_INTERVAL
+    try:
+        CREDS.refresh(Request())
+    except Exception as e:
+        logger.error("Error refreshing Google credentials: %s", e)
+        interval = CREDS_RETRY_INTERVAL
+    timer = threading.Timer(interval, refresh_drive_credentials)
+    timer.daemon = True
+    timer.start()
+
+def get_drive_session():
+    """
+    Returns the AuthorizedSession shared by all upload threads, creating it on first use.
+    requests pools the HTTPS connections, so uploads reuse already open TLS connections.
+    """
+    global _drive_session
+    with _drive_lock:
+        if _drive_session is None:
+            session = AuthorizedSession(CREDS)
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=DRIVE_UPLOAD_WORKERS))
+            _drive_session = session
+        return _drive_session
+
+def upload_multipart(session, metadata, data, content_type):
+    """
+    Sends metadata and data (any bytes-like object) in a single multipart/related request.
+    data is copied exactly once, into the request body.
+    """
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n".encode(),
+        json.dumps(metadata).encode(),
+        f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n\r\n".encode(),
+        data,
+        f"\r\n--{boundary}--".encode(),
+    ])
+    response = session.post(
+        DRIVE_UPLOAD_URL,
+        params={"uploadType": "multipart", "fields": DRIVE_UPLOAD_FIELDS},
+        data=body,
+        headers={"Content-Type": f"multipart/related; boundary={boundary}"}
+    )
+    response.raise_for_status()
+    return response.json()
 
-def get_drive_service():
-    scopes = ["https://www.googleapis.com/auth/drive"]
-    creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=scopes)
-    service = build("drive", "v3", credentials=creds)
-    return service
+def upload_resumable(session, metadata, stream, size, content_type):
+    """
+    Opens a resumable upload session and sends stream (read sequentially, never rewound)
+    chunk by chunk. size may be None if unknown.
+    """
+    headers = {"X-Upload-Content-Type": content_type}
+    if size is not None:
+        headers["X-Upload-Content-Length"] = str(size)
+    response = session.post(
+        DRIVE_UPLOAD_URL,
+        params={"uploadType": "resumable", "fields": DRIVE_UPLOAD_FIELDS},
+        json=metadata,
+        headers=headers
+    )
+    response.raise_for_status()
+    session_url = response.headers["Location"]
+
+    # offset is the first byte Drive has not stored; pending holds the bytes from offset
+    # on that were already read from stream (left over from a partially stored chunk)
+    offset = 0
+    pending = b""
+    while True:
+        chunk = pending + stream.read(STREAM_CHUNK_SIZE - len(pending))
+        end = offset + len(chunk)
+        if len(chunk) < STREAM_CHUNK_SIZE or end == size:
+            total = str(end)
+        else:
+            total = "*" if size is None else str(size)
+        if chunk:
+            content_range = f"bytes {offset}-{end - 1}/{total}"
+        else:
+            # The previous chunk ended exactly at EOF of a stream with unknown size
+            content_range = f"bytes */{total}"
+        response = session.put(session_url, data=chunk, headers={"Content-Range": content_range})
+        if response.status_code == 308:
+            # "Resume Incomplete": continue from whatever the server has stored
+            stored = response.headers.get("Range")
+            stored_end = int(stored.rsplit("-", 1)[1]) + 1 if stored else 0
+            if stored_end < offset:
+                raise RuntimeError("Drive asked to resend data that is no longer buffered")
+            pending = chunk[stored_end - offset:]
+            offset = stored_end
+            continue
+        response.raise_for_status()
+        return response.json()
 
-def upload_to_drive(service, file_stream, file_name):
+def upload_to_drive(file_name, mime_type=None, data=None, stream=None, size=None):
+    """
+    Uploads either data (bytes-like, one multipart request) or stream (resumable upload
+    of size bytes, if known). Returns the webViewLink, or None if the upload failed.
+    """
     try:
+        session = get_drive_session()
         file_metadata = {
             "name": file_name,
             "parents": [DRIVE_FOLDER_ID]
         }
-        media = MediaIoBaseUpload(file_stream, mimetype='application/octet-stream', resumable=True)
+        # Without a type from Telegram, let Drive detect it from the name and content
+        if mime_type:
+            file_metadata["mimeType"] = mime_type
         
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id, webViewLink'
-        ).execute()
+        content_type = mime_type or "application/octet-stream"
+        if data is not None:
+            file = upload_multipart(session, file_metadata, data, content_type)
+        else:
+            file = upload_resumable(session, file_metadata, stream, size, content_type)
         
-        logger.info(f"File uploaded successfully. ID: {file.get('id')}")
+        logger.info("File uploaded successfully. ID: %s", file.get('id'))
         return file.get('webViewLink')
     except Exception as e:
-        logger.error(f"Error uploading file: {e}")
+        logger.error("Error uploading file: %s", e)
         return None
 
 # --- Telegram Bot Section ---
 
+# (message attribute, extractor) pairs, checked in order. Each extractor receives the
+# attachment and returns (file_to_process, file_name, mime_type).
+FILE_EXTRACTORS = [
+    ("document", lambda document: (document, document.file_name or f"document_{document.file_unique_id}", document.mime_type)),
+    ("video", lambda video: (video, video.file_name or f"video_{video.file_unique_id}.mp4", video.mime_type)),
+    # Photos carry no mime_type; Telegram always re-encodes them as JPEG
+    ("photo", lambda photo: (photo[-1], f"photo_{photo[-1].file_unique_id}.jpg", "image/jpeg")),
+    ("audio", lambda audio: (audio, audio.file_name or f"audio_{audio.file_unique_id}.mp3", audio.mime_type)),
+]
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Response to the /start command"""
     await update.message.reply_text("سلام! 👋\nهر فایل، عکس یا فیلمی بفرستی، من آن را در گوگل درایو ذخیره می‌کنم.")
 
+async def transfer_file(bot, file_to_process, file_name, mime_type):
+    """
+    Copies one Telegram file to Google Drive.
+    Returns the webViewLink, or None if the Drive upload failed.
+    """
+    bot_file = await bot.get_file(file_to_process.file_id)
+    
+    # *** THIS IS THE FIX for '.loop' error ***
+    # We get the current running event loop instead of using context.application.loop
+    loop = asyncio.get_running_loop()
+    
+    async with upload_slots:
+        if bot_file.file_size and bot_file.file_size < SIMPLE_UPLOAD_LIMIT:
+            # Small files: one multipart request saves the resumable session round-trip
+            file_data = await download_file(bot_file.file_path, bot_file.file_size)
+            return await loop.run_in_executor(UPLOAD_EXECUTOR, upload_to_drive, file_name, mime_type, file_data)
+
+        # Download and upload run concurrently: the download task fills the queue
+        # while the executor thread drains it into the Drive resumable upload.
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        download_task = asyncio.create_task(stream_download(bot_file.file_path, queue, bot_file.file_size))
+        # BufferedReader.read(n) keeps reading until it has n bytes or hits the end
+        stream = io.BufferedReader(QueueReader(queue, loop), buffer_size=STREAM_CHUNK_SIZE)
+        try:
+            return await loop.run_in_executor(
+                UPLOAD_EXECUTOR, upload_to_drive, file_name, mime_type, None, stream, bot_file.file_size
+            )
+        finally:
+            download_task.cancel()
+            # If we got here early (cancelled, or the upload gave up), the upload thread may
+            # still be waiting on the queue; wake it so the worker thread is released.
+            abort_queue(queue, TelegramDownloadError("Telegram download was aborted"))
+
+# media_group_id -> [(message, file_to_process, file_name, mime_type), ...] received so far
+pending_albums = {}
+# media_group_id -> task that uploads the album once no new item arrives
+album_timers = {}
+
+def queue_album_file(context, message, file_to_process, file_name, mime_type):
+    """
+    Telegram delivers every album item as its own update. Collects them and
+    (re)starts the debounce timer so the album is handled once, as a whole.
+    """
+    group_id = message.media_group_id
+    pending_albums.setdefault(group_id, []).append((message, file_to_process, file_name, mime_type))
+    timer = album_timers.get(group_id)
+    if timer:
+        timer.cancel()
+    album_timers[group_id] = context.application.create_task(process_album(context, group_id))
+
+async def process_album(context, group_id):
+    """Uploads all items of an album concurrently behind a single status message."""
+    await asyncio.sleep(ALBUM_DEBOUNCE)
+    # No await between these pops and the sleep, so a cancel can no longer split the album
+    del album_timers[group_id]
+    album = pending_albums.pop(group_id)
+
+    status_message = await album[0][0].reply_text(f"در حال انتقال {len(album)} فایل به گوگل درایو... ☁️")
+    results = await asyncio.gather(
+        *(transfer_file(context.bot, file_to_process, file_name, mime_type)
+          for _, file_to_process, file_name, mime_type in album),
+        return_exceptions=True
+    )
+
+    lines = ["نتیجه آپلود آلبوم:"]
+    too_big = False
+    for (_, _, file_name, _), result in zip(album, results):
+        if isinstance(result, BadRequest) and "File is too big" in result.message:
+            logger.warning("File too big: %s", file_name)
+            lines.append(f"❌ {html.escape(file_name)} (فایل خیلی بزرگ است)")
+            too_big = True
+            continue
+        if isinstance(result, BaseException):
+            logger.error("Error processing album file %s: %s", file_name, result)
+            result = None
+        if result:
+            lines.append(f"✅ <a href='{result}'>{html.escape(file_name)}</a>")
+        else:
+            lines.append(f"❌ {html.escape(file_name)}")
+    if too_big:
+        lines.append("\nمن فقط می‌توانم فایل‌های تا ۲۰ مگابایت را پردازش کنم.")
+    await status_message.edit_text(
+        "\n".join(lines),
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True
+    )
+
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles files, photos, videos, or audio.
@@ -68,49 +464,31 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     file_name = ""
     file_to_process = None
+    mime_type = None
 
-    if message.document:
-        file_to_process = message.document
-        file_name = message.document.file_name
-    elif message.video:
-        file_to_process = message.video
-        file_name = message.video.file_name or f"video_{message.video.file_unique_id}.mp4"
-    elif message.photo:
-        file_to_process = message.photo[-1]
-        file_name = f"photo_{file_to_process.file_unique_id}.jpg"
-    elif message.audio:
-        file_to_process = message.audio
-        file_name = message.audio.file_name or f"audio_{message.audio.file_unique_id}.mp3"
+    for attribute, extract in FILE_EXTRACTORS:
+        attachment = getattr(message, attribute)
+        if attachment:
+            file_to_process, file_name, mime_type = extract(attachment)
+            break
     
     if not file_to_process:
         await message.reply_text("فرمت فایل پشتیبانی نمی‌شود.")
         return
 
-    status_message = await message.reply_text("در حال دریافت فایل از تلگرام...")
+    if message.media_group_id:
+        queue_album_file(context, message, file_to_process, file_name, mime_type)
+        return
+
+    # One status message for the whole transfer; it is edited only once with the result
+    status_message = await message.reply_text("در حال انتقال فایل به گوگل درایو... ☁️")
     
     try:
-        file_id = file_to_process.file_id
-        bot_file = await context.bot.get_file(file_id)
-        
-        file_stream = io.BytesIO()
-        await bot_file.download_to_memory(file_stream)
-        file_stream.seek(0)
-        
-        await status_message.edit_text("در حال آپلود در گوگل درایو... ☁️")
-        
-        # *** THIS IS THE FIX for '.loop' error ***
-        # We get the current running event loop instead of using context.application.loop
-        loop = asyncio.get_running_loop()
-        
-        service = await loop.run_in_executor(None, get_drive_service)
-        
-        file_link = await loop.run_in_executor(
-            None, upload_to_drive, service, file_stream, file_name
-        )
+        file_link = await transfer_file(context.bot, file_to_process, file_name, mime_type)
 
         if file_link:
             await status_message.edit_text(
-                f"✅ فایل با موفقیت آپلود شد!\n\n<a href='{file_link}'>{file_name}</a>",
+                f"✅ فایل با موفقیت آپلود شد!\n\n<a href='{file_link}'>{html.escape(file_name)}</a>",
                 parse_mode=ParseMode.HTML,
                 disable_web_page_preview=True
             )
@@ -119,24 +497,47 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
     except BadRequest as e:
         if "File is too big" in e.message:
-            logger.warning(f"File too big: {file_name}")
+            logger.warning("File too big: %s", file_name)
             await status_message.edit_text("❌ خطا: فایل خیلی بزرگ است.\nمن فقط می‌توانم فایل‌های تا ۲۰ مگابایت را پردازش کنم.")
         else:
-            logger.error(f"BadRequest error processing file: {e}")
+            logger.error("BadRequest error processing file: %s", e)
             await status_message.edit_text(f"خطای تلگرام: {e.message}")
             
     except Exception as e:
-        logger.error(f"General error processing file: {e}")
-        await status_message.edit_text(f"خطای ناشناخته: {e}")
+        logger.error("General error processing file: %s", e)
+        # Exception text may contain internals (URLs, tokens); keep it out of the chat
+        await status_message.edit_text("❌ خطای ناشناخته در پردازش فایل.")
+
+async def close_download_client(application: Application):
+    """Closes the pooled download connections on shutdown."""
+    await DOWNLOAD_CLIENT.aclose()
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Logs the error."""
-    logger.error(f"Exception while handling an update: {context.error}", exc_info=context.error)
+    logger.error("Exception while handling an update: %s", context.error, exc_info=context.error)
 
 def main() -> None:
     """Run the bot."""
     # Create the Application
-    application = Application.builder().token(TOKEN).build()
+    telegram_request = HTTPXRequest(http_version="2", connection_pool_size=TELEGRAM_POOL_SIZE)
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .request(telegram_request)
+        # Telegram's documented limits: ~30 messages/s overall, 20/min per group.
+        # 429 RetryAfter responses are waited out and retried up to 3 times.
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=30,
+            overall_time_period=1,
+            group_max_rate=20,
+            group_time_period=60,
+            max_retries=3
+        ))
+        # Let uploads (and album items arriving meanwhile) be handled in parallel
+        .concurrent_updates(True)
+        .post_shutdown(close_download_client)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -148,14 +549,25 @@ def main() -> None:
     )
     application.add_error_handler(error_handler)
 
+    # Fetch the first token now so no upload waits for it
+    refresh_drive_credentials()
+
+    if uvloop is not None:
+        # run_webhook creates its loop through the policy, so the webhook server
+        # and every handler run on uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     # This is the new part: Run the bot as a webhook server
     # It handles initialize, set_webhook, and running the server all at once.
-    logger.info(f"Starting webhook server on port {PORT}")
+    logger.info("Starting webhook server on port %s", PORT)
     application.run_webhook(
         listen="0.0.0.0",
         port=PORT,
         url_path=TOKEN,  # A secret path, using the token is common
-        webhook_url=f"{WEBHOOK_URL}/{TOKEN}"
+        webhook_url=f"{WEBHOOK_URL}/{TOKEN}",
+        max_connections=TG_WEBHOOK_CONNS,
+        # Handlers only look at messages; let Telegram drop every other update type
+        allowed_updates=[Update.MESSAGE]
     )
 
 if __name__ == "__main__":